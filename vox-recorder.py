@@ -15,17 +15,21 @@ GNU General Public License for more details.
 """
 import json
 import os
+import queue
 import shutil
 import signal
 import sys
 import time
 import wave
-from array import array
-from struct import pack
-from sys import byteorder
 
+import numpy as np
 import pyaudio
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # Version of the script
 __version__ = "2025.12.04.04" # Versão atualizada
 
@@ -35,33 +39,42 @@ RECORD_AFTER_SILENCE_SECS = 2
 WAVEFILES_STORAGEPATH = "./records"
 RATE = 44100
 MAXIMUMVOL = 32767
-CHUNK_SIZE = 1024
+CHUNK_SIZE = 4096 # Latência de detecção: CHUNK_SIZE / RATE ≈ 93ms (bem abaixo de RECORD_AFTER_SILENCE_SECS)
 FORMAT = pyaudio.paInt16
+SAMPLE_DTYPE = np.dtype('<i2') # Formato das amostras no stream e no WAV (little-endian)
 PRE_ROLL_SECS = 2 # Pre-roll buffer (segundos)
 VOICE_MIN_DURATION_SECS = 0.5 # Min duration before start ro prevent record clicks etc 
+STATUS_REFRESH_SECS = 0.1 # Intervalo mínimo entre atualizações do VU-meter
+WAV_WRITE_BUFFER = 128 * 1024 # Buffer de escrita do arquivo WAV (bytes)
+VU_WIDTH = 30 # Largura da barra do VU-meter
+VU_CELL_BYTES = len("█".encode()) # Bytes UTF-8 de cada célula preenchida
+VU_FULL = memoryview(("█" * VU_WIDTH).encode()) # memoryview: fatiar não copia
+VU_EMPTY = memoryview(b" " * VU_WIDTH)
+VU_THRESHOLD_POS = min(SILENCE_THRESHOLD * VU_WIDTH // MAXIMUMVOL, VU_WIDTH) # Posição do marcador do limiar
 
 class suppress_stdout_stderr(object):
+    """Silence stdout and stderr, including output written directly to the file descriptors
+    by C libraries such as PortAudio. Used once, around the PyAudio initialization"""
     def __enter__(self):
-        self.outnull_file = open(os.devnull, 'w')
-        self.errnull_file = open(os.devnull, 'w')
+        self.null_file = open(os.devnull, 'w')
 
         self.old_stdout_fileno_undup = sys.stdout.fileno()
         self.old_stderr_fileno_undup = sys.stderr.fileno()
 
-        self.old_stdout_fileno = os.dup(sys.stdout.fileno())
-        self.old_stderr_fileno = os.dup(sys.stderr.fileno())
+        self.old_stdout_fileno = os.dup(self.old_stdout_fileno_undup)
+        self.old_stderr_fileno = os.dup(self.old_stderr_fileno_undup)
 
         self.old_stdout = sys.stdout
         self.old_stderr = sys.stderr
 
-        os.dup2(self.outnull_file.fileno(), self.old_stdout_fileno_undup)
-        os.dup2(self.errnull_file.fileno(), self.old_stderr_fileno_undup)
+        # Um único descritor de os.devnull atende stdout e stderr
+        os.dup2(self.null_file.fileno(), self.old_stdout_fileno_undup)
+        os.dup2(self.null_file.fileno(), self.old_stderr_fileno_undup)
 
-        sys.stdout = self.outnull_file        
-        sys.stderr = self.errnull_file
+        sys.stdout = sys.stderr = self.null_file
         return self
 
-    def __exit__(self, *_):        
+    def __exit__(self, *_):
         sys.stdout = self.old_stdout
         sys.stderr = self.old_stderr
 
@@ -71,31 +84,47 @@ class suppress_stdout_stderr(object):
         os.close(self.old_stdout_fileno)
         os.close(self.old_stderr_fileno)
 
-        self.outnull_file.close()
-        self.errnull_file.close()
+        self.null_file.close()
+
+# Linha de status do VU-meter, reaproveitada a cada atualização
+status_line = bytearray()
+
+# Largura do terminal em cache, atualizada apenas quando a janela é redimensionada
+terminal_width = shutil.get_terminal_size((80, 24)).columns
 
 def signal_handler(signum, frame):
     print("\nProgram interrupted by user. Exiting...")
     sys.exit(0)
 
-def show_status(snd_data, record_started, record_started_stamp, wav_filename):
+def resize_handler(signum, frame):
+    """Refresh the cached terminal width after a window resize (SIGWINCH)"""
+    global terminal_width
+    terminal_width = shutil.get_terminal_size((80, 24)).columns
+
+def append_vu_cells(line, first, last, vu_level):
+    """Append the VU-meter cells [first, last) to 'line': filled below 'vu_level', blank above"""
+    filled = min(max(vu_level - first, 0), last - first)
+    line += VU_FULL[:filled * VU_CELL_BYTES]
+    line += VU_EMPTY[:last - first - filled]
+
+def show_status(peak, record_started, record_started_stamp, wav_name):
     """Displays volume levels with a VU-meter bar, threshold marker, and indicator for audio presence or recording"""
-    
-    # 1. OBTÉM A LARGURA ATUAL DO TERMINAL
-    try:
-        terminal_width = shutil.get_terminal_size().columns
-    except:
-        # Fallback para terminais sem suporte
-        terminal_width = 80 
-        
+
     # Calculate simple VU level for visual feedback
-    vu_level = min(int((max(abs(i) for i in snd_data) / MAXIMUMVOL) * 30), 30)
-    vu_bar = "█" * vu_level + " " * (30 - vu_level)
-    
+    vu_level = min(peak * VU_WIDTH // MAXIMUMVOL, VU_WIDTH)
+
+    # Reaproveita o mesmo bytearray a cada atualização, sem montar strings intermediárias
+    line = status_line
+    del line[:]
+    line += b'\rVU: ['
+
     # Add a marker for the threshold
-    threshold_position = min(int((SILENCE_THRESHOLD / MAXIMUMVOL) * 30), 30)
-    if threshold_position < 30:
-        vu_bar = vu_bar[:threshold_position] + '|' + vu_bar[threshold_position + 1:]
+    if VU_THRESHOLD_POS < VU_WIDTH:
+        append_vu_cells(line, 0, VU_THRESHOLD_POS, vu_level)
+        line += b'|'
+        append_vu_cells(line, VU_THRESHOLD_POS + 1, VU_WIDTH, vu_level)
+    else:
+        append_vu_cells(line, 0, VU_WIDTH, vu_level)
     
     # Audio presence or recording indicator
     if record_started:
@@ -103,75 +132,170 @@ def show_status(snd_data, record_started, record_started_stamp, wav_filename):
         status = "Recording in progress"
     else:
         cycle = int(time.time() * 2) % 2
-        indicator = '⏸' if cycle and any(abs(x) > 0 for x in snd_data) else ' '
+        indicator = '⏸' if cycle and peak > 0 else ' '
         status = "Waiting Audio Level"
 
-    # Constrói a primeira parte da mensagem
-    main_message = f'VU: [{vu_bar}] | {indicator} {status}'
+    # Constrói o restante da mensagem
+    main_message = f'] | {indicator} {status}'
     
     # Adiciona detalhes do arquivo/tempo, se estiver gravando
     if record_started:
         elapsed = time.time() - record_started_stamp
-        detail_message = f' | File: {os.path.basename(wav_filename)}.wav | Time: {elapsed:.1f}s'
+        detail_message = f' | File: {wav_name}.wav | Time: {elapsed:.1f}s'
     else:
         detail_message = ''
 
-    full_line = main_message + detail_message
+    text = main_message + detail_message
+    line += text.encode()
     
-    # 2. CALCULA ESPAÇO PARA LIMPAR (ADAPTAÇÃO)
+    # 1. CALCULA ESPAÇO PARA LIMPAR (ADAPTAÇÃO)
     # Garante que a linha completa seja limpa, preenchendo o restante com espaços
-    padding_needed = terminal_width - len(full_line)
+    padding_needed = terminal_width - (len('VU: [') + VU_WIDTH + len(text))
     
     if padding_needed > 0:
-        full_line += ' ' * padding_needed
+        line += b' ' * padding_needed
 
-    # 3. ESCREVE E FORÇA A ATUALIZAÇÃO DA LINHA
-    sys.stdout.write('\r' + full_line)
+    # 2. ESCREVE E FORÇA A ATUALIZAÇÃO DA LINHA
+    # Esvazia antes a camada de texto para manter a ordem com as mensagens de print()
     sys.stdout.flush()
+    sys.stdout.buffer.write(line)
+    sys.stdout.buffer.flush()
+
+# Kernels DSP: compilados com numba quando disponível, NumPy caso contrário
+if numba is not None:
+    @numba.njit(nogil=True, cache=True, fastmath=True)
+    def peak_i16(a):
+        """Returns the highest absolute value in the int16 array 'a'"""
+        m = 0
+        for i in range(a.size):
+            v = np.int32(a[i])
+            if v < 0:
+                v = -v
+            if v > m:
+                m = v
+        return m
+
+    @numba.njit(nogil=True, cache=True)
+    def has_peak_over(a, thr):
+        """Returns 'True' as soon as a sample of 'a' exceeds +/- 'thr'"""
+        for i in range(a.size):
+            v = a[i]
+            if v > thr or v < -thr:
+                return True
+        return False
+
+    @numba.njit(nogil=True, cache=True, fastmath=True)
+    def normalize_i16(a, out, scale_q15):
+        """Writes 'a' multiplied by the Q15 fixed-point 'scale_q15' into 'out', clipped to +/- MAXIMUMVOL"""
+        for i in range(a.size):
+            v = (np.int64(a[i]) * scale_q15) >> 15
+            if v > MAXIMUMVOL:
+                v = MAXIMUMVOL
+            elif v < -MAXIMUMVOL:
+                v = -MAXIMUMVOL
+            out[i] = np.int16(v)
+
+    @numba.njit(nogil=True, cache=True)
+    def trim_i16(a):
+        """Returns the (start, end) slice of 'a' between the first and last sample above the threshold"""
+        start = 0
+        while start < a.size and -SILENCE_THRESHOLD <= a[start] <= SILENCE_THRESHOLD:
+            start += 1
+        end = a.size
+        while end > start and -SILENCE_THRESHOLD <= a[end - 1] <= SILENCE_THRESHOLD:
+            end -= 1
+        return start, end
+else:
+    def peak_i16(a):
+        """Returns the highest absolute value in the int16 array 'a'"""
+        return np.abs(a, dtype=np.int32).max()
+
+    def has_peak_over(a, thr):
+        """Returns 'True' if a sample of 'a' exceeds +/- 'thr'"""
+        return bool(((a > thr) | (a < -thr)).any())
+
+    def normalize_i16(a, out, scale_q15):
+        """Writes 'a' multiplied by the Q15 fixed-point 'scale_q15' into 'out', clipped to +/- MAXIMUMVOL"""
+        tmp = a.astype(np.int64)
+        tmp *= scale_q15
+        tmp >>= 15
+        np.clip(tmp, -MAXIMUMVOL, MAXIMUMVOL, out=tmp)
+        out[:] = tmp
+
+    def trim_i16(a):
+        """Returns the (start, end) slice of 'a' between the first and last sample above the threshold"""
+        # Varre blocos de CHUNK_SIZE a partir de cada extremidade e para no primeiro com som,
+        # sem construir uma máscara do tamanho da gravação inteira
+        for block_start in range(0, a.size, CHUNK_SIZE):
+            block = a[block_start:block_start + CHUNK_SIZE]
+            loud = (block > SILENCE_THRESHOLD) | (block < -SILENCE_THRESHOLD)
+            if loud.any():
+                start = block_start + int(np.argmax(loud))
+                break
+        else:
+            return 0, 0
+        for block_end in range(a.size, start, -CHUNK_SIZE):
+            block = a[max(start, block_end - CHUNK_SIZE):block_end]
+            loud = (block > SILENCE_THRESHOLD) | (block < -SILENCE_THRESHOLD)
+            if loud.any():
+                return start, block_end - int(np.argmax(loud[::-1]))
+
+def peak_amplitude(snd_data):
+    """Returns the highest absolute sample value in 'snd_data'"""
+    return int(peak_i16(snd_data))
 
 def voice_detected(snd_data):
     """Returns 'True' if sound peaked above the 'silent' threshold"""
-    return max(abs(i) for i in snd_data) > SILENCE_THRESHOLD
+    return has_peak_over(snd_data, SILENCE_THRESHOLD)
 
-def normalize(snd_data):
-    """Average the volume out"""
-    max_amplitude = max(abs(i) for i in snd_data)
+def normalize(snd_data, max_amplitude):
+    """Average the volume out, given the peak 'max_amplitude' of 'snd_data'"""
     if max_amplitude == 0:
         return snd_data
-    times = float(MAXIMUMVOL) / max_amplitude
-    return array('h', [int(min(MAXIMUMVOL, max(-MAXIMUMVOL, i * times))) for i in snd_data])
+    # Ganho em ponto fixo Q15: todo o cálculo permanece em inteiros
+    scale_q15 = MAXIMUMVOL * 32768 // max_amplitude
+    out = np.empty_like(snd_data)
+    normalize_i16(snd_data, out, scale_q15)
+    return out
 
 def trim(snd_data):
     """Trim the blank spots at the start and end"""
-    def _trim(snd_data):
-        record_started = False
-        r = array('h')
-        for i in snd_data:
-            if not record_started and abs(i) > SILENCE_THRESHOLD:
-                record_started = True
-            if record_started:
-                r.append(i)
-        return r
-
-    # Trim to the left
-    snd_data = _trim(snd_data)
-    # Trim to the right
-    snd_data.reverse()
-    snd_data = _trim(snd_data)
-    snd_data.reverse()
-    return snd_data
+    start, end = trim_i16(snd_data)
+    return snd_data[start:end]
 
 def add_silence(snd_data, seconds):
     """Add silence to the start and end of 'snd_data' of length 'seconds' (float)"""
-    silence = array('h', [0 for _ in range(int(seconds * RATE))])
-    return silence + snd_data + silence
-
-def wait_for_activity():
-    """Listen sound and quit when sound is detected, returning pre-roll buffer."""
-    with suppress_stdout_stderr():
-        p = pyaudio.PyAudio()
-        stream = p.open(format=FORMAT, channels=1, rate=RATE, input=True, frames_per_buffer=CHUNK_SIZE)
-    
+    n = int(seconds * RATE)
+    out = np.empty(n * 2 + snd_data.size, dtype=np.int16)
+    out[:n] = 0
+    out[n:n + snd_data.size] = snd_data
+    out[n + snd_data.size:] = 0
+    return out
+
+def append_samples(buf, n_samples, samples):
+    """Copy 'samples' into 'buf' after the first 'n_samples', doubling 'buf' when it is full.
+    Returns the (possibly reallocated) buffer and the new sample count"""
+    end = n_samples + len(samples)
+    if end > buf.size:
+        buf = np.resize(buf, max(buf.size * 2, end))
+    buf[n_samples:end] = samples
+    return buf, end
+
+def open_input_stream(p):
+    """Open an input stream whose PortAudio thread pushes each captured chunk into a queue.
+    Returns the stream and the queue of raw chunks"""
+    chunks = queue.SimpleQueue()
+
+    def callback(in_data, frame_count, time_info, status):
+        chunks.put_nowait(in_data)
+        return None, pyaudio.paContinue
+
+    stream = p.open(format=FORMAT, channels=1, rate=RATE, input=True, frames_per_buffer=CHUNK_SIZE,
+                    stream_callback=callback)
+    return stream, chunks
+
+def wait_for_activity(chunks):
+    """Listen sound from the 'chunks' queue and quit when sound is detected, returning pre-roll buffer."""
     # Configuração do buffer de pré-gravação
     frames_per_buffer = RATE * PRE_ROLL_SECS
     buffer_chunks = frames_per_buffer // CHUNK_SIZE
@@ -180,95 +304,99 @@ def wait_for_activity():
     min_voice_chunks = max(1, int(VOICE_MIN_DURATION_SECS * RATE / CHUNK_SIZE))
     consecutive_voice_chunks = 0
     
-    pre_roll_buffer = [] # Lista para armazenar os chunks
+    # Buffer circular pré-alocado: cada linha guarda um chunk, 'head' aponta para o mais antigo
+    pre_roll_buffer = np.empty((buffer_chunks, CHUNK_SIZE), dtype=np.int16)
+    head = 0
+    filled = 0
+    last_draw = 0.0
     
-    try:
-        while True:
-            # Lendo um chunk de áudio
-            snd_data_raw = stream.read(CHUNK_SIZE, exception_on_overflow=False) 
-            snd_data = array('h', snd_data_raw)
-            if byteorder == 'big':
-                snd_data.byteswap()
-            
-            # Gerenciamento do Buffer (deve vir antes da checagem de voz)
-            pre_roll_buffer.append(snd_data)
-            
-            # Mantém apenas a quantidade necessária de chunks para o PRE_ROLL_SECS
-            if len(pre_roll_buffer) > buffer_chunks:
-                pre_roll_buffer.pop(0)
-
-            voice = voice_detected(snd_data)
-            show_status(snd_data, False, 0, '')
-            
-            # Lógica de Duração Mínima de Voz
-            if voice:
-                consecutive_voice_chunks += 1
-                if consecutive_voice_chunks >= min_voice_chunks:
-                    # O áudio superou o limiar pelo tempo mínimo necessário
-                    break 
-            else:
-                consecutive_voice_chunks = 0 # Reseta a contagem se encontrar silêncio
-                
-    finally:
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+    while True:
+        # Aguarda o próximo chunk entregue pela thread do PortAudio
+        snd_data_raw = chunks.get()
+
+        # Gerenciamento do Buffer: sobrescreve o chunk mais antigo, sem alocar
+        snd_data = pre_roll_buffer[head]
+        np.copyto(snd_data, np.frombuffer(snd_data_raw, dtype=SAMPLE_DTYPE))
+        head = (head + 1) % buffer_chunks
+        filled = min(filled + 1, buffer_chunks)
+
+        voice = voice_detected(snd_data)
+        now = time.monotonic()
+        if now - last_draw >= STATUS_REFRESH_SECS:
+            show_status(peak_amplitude(snd_data), False, 0, '')
+            last_draw = now
         
-    # Retorna o áudio que estava no buffer, incluindo o chunk de detecção
-    return pre_roll_buffer
+        # Lógica de Duração Mínima de Voz
+        if voice:
+            consecutive_voice_chunks += 1
+            if consecutive_voice_chunks >= min_voice_chunks:
+                # O áudio superou o limiar pelo tempo mínimo necessário
+                break 
+        else:
+            consecutive_voice_chunks = 0 # Reseta a contagem se encontrar silêncio
 
-def record_audio(initial_buffer):
-    """Record audio when activity is detected, starting with initial_buffer."""
+    # Retorna o áudio que estava no buffer, incluindo o chunk de detecção, em ordem cronológica
+    if filled < buffer_chunks:
+        return pre_roll_buffer[:filled].ravel()
+    return np.concatenate((pre_roll_buffer[head:], pre_roll_buffer[:head])).ravel()
+
+def record_audio(p, chunks, initial_buffer):
+    """Record audio from the 'chunks' queue when activity is detected, starting with initial_buffer."""
     # metadata = get_metadata()
-    with suppress_stdout_stderr():
-        p = pyaudio.PyAudio()
-        stream = p.open(format=FORMAT, channels=1, rate=RATE, input=True, frames_per_buffer=CHUNK_SIZE)
-        
+    # Buffer contíguo para a gravação (60s iniciais, dobra quando enche)
+    buf = np.empty(RATE * 60, dtype=np.int16)
+    n_samples = 0
+
     # Inicia com o buffer de pré-gravação
-    snd_data = array('h')
-    for chunk in initial_buffer:
-        snd_data.extend(chunk)
+    buf, n_samples = append_samples(buf, n_samples, initial_buffer)
+
+    # Pico acumulado durante a captura, usado depois pela normalização
+    running_peak = peak_amplitude(initial_buffer)
 
     record_started = True
     record_started_stamp = last_voice_stamp = time.time()
+    last_draw = 0.0
     
     # Nome do arquivo simplificado com prefixo 'tx_' e timestamp
     wav_filename = os.path.join(WAVEFILES_STORAGEPATH, f'tx_{time.strftime("%Y%m%d%H%M%S")}')
+    wav_name = os.path.basename(wav_filename)
     
-    try:
-        while True:
-            # Lendo o chunk de áudio
-            chunk = array('h', stream.read(CHUNK_SIZE, exception_on_overflow=False))
-            if byteorder == 'big':
-                chunk.byteswap()
-            snd_data.extend(chunk)
-
-            voice = voice_detected(chunk)
-            show_status(chunk, record_started, record_started_stamp, wav_filename)
-
-            # A gravação já começou, apenas atualiza o timestamp se houver voz
-            if voice:
-                last_voice_stamp = time.time()
-
-            # Finaliza a gravação após X segundos de silêncio
-            if time.time() > last_voice_stamp + RECORD_AFTER_SILENCE_SECS:
-                break
-    finally:
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+    while True:
+        # Aguarda o próximo chunk entregue pela thread do PortAudio
+        # A cópia para o buffer nativo já converte a ordem dos bytes, se necessário
+        chunk_start = n_samples
+        buf, n_samples = append_samples(buf, n_samples, np.frombuffer(chunks.get(), dtype=SAMPLE_DTYPE))
+        chunk = buf[chunk_start:n_samples]
+
+        # O pico do chunk serve para a detecção de voz, o VU-meter e a normalização
+        peak = peak_amplitude(chunk)
+        running_peak = max(running_peak, peak)
+        voice = peak > SILENCE_THRESHOLD
+        now = time.monotonic()
+        if now - last_draw >= STATUS_REFRESH_SECS:
+            show_status(peak, record_started, record_started_stamp, wav_name)
+            last_draw = now
+
+        # A gravação já começou, apenas atualiza o timestamp se houver voz
+        if voice:
+            last_voice_stamp = time.time()
+
+        # Finaliza a gravação após X segundos de silêncio
+        if time.time() > last_voice_stamp + RECORD_AFTER_SILENCE_SECS:
+            break
 
     # Process audio
-    snd_data = normalize(snd_data)
+    snd_data = buf[:n_samples]
+    snd_data = normalize(snd_data, running_peak)
     snd_data = trim(snd_data)
     snd_data = add_silence(snd_data, 0.5)
 
     # Save audio with wave module
-    with wave.open(f"{wav_filename}.wav", 'wb') as wf:
+    with open(f"{wav_filename}.wav", 'wb', buffering=WAV_WRITE_BUFFER) as wav_file, wave.open(wav_file, 'wb') as wf:
         wf.setnchannels(1)
         wf.setsampwidth(p.get_sample_size(FORMAT))
         wf.setframerate(RATE)
-        wf.writeframes(pack('<' + ('h' * len(snd_data)), *snd_data))
+        wf.writeframes(snd_data.astype(SAMPLE_DTYPE, copy=False).tobytes())
 
     # Output final message
     endtime = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
@@ -284,14 +412,29 @@ def voxrecord():
     # Register the signal handler for SIGINT (Ctrl-C)
     signal.signal(signal.SIGINT, signal_handler)
 
-    while True:
-        # Captura o buffer de pré-gravação
-        initial_buffer = wait_for_activity()
-        try:
-            # Passa o buffer para iniciar a gravação
-            _, _, wav_filename = record_audio(initial_buffer)
-        except Exception as e:
-            print(f"Error during recording: {e}")
+    # Register the signal handler for terminal resizes, where supported
+    if hasattr(signal, 'SIGWINCH'):
+        signal.signal(signal.SIGWINCH, resize_handler)
+
+    # Uma única instância do PyAudio e um único stream servem todos os ciclos,
+    # sem lacuna de amostras entre a espera e a gravação
+    with suppress_stdout_stderr():
+        p = pyaudio.PyAudio()
+        stream, chunks = open_input_stream(p)
+
+    try:
+        while True:
+            # Captura o buffer de pré-gravação
+            initial_buffer = wait_for_activity(chunks)
+            try:
+                # Passa o buffer para iniciar a gravação
+                _, _, wav_filename = record_audio(p, chunks, initial_buffer)
+            except Exception as e:
+                print(f"Error during recording: {e}")
+    finally:
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
 
 
 if __name__ == '__main__':